@@ -5,20 +5,44 @@ Sends commands via stdin and reads output until a sentinel token,
 avoiding the ~2s startup overhead on every call.
 """
 
+import functools
 import logging
 import os
-import queue
-import select
+import re
+import secrets
+import selectors
 import shutil
 import subprocess
+import tempfile
 import threading
 import time
 from typing import Optional
 
 logger = logging.getLogger(__name__)
 
+# -q: no banner or prompts, -T: errors return to the main loop instead of
+# nesting break loops, -n: no line editing
+GAP_OPTIONS = ["-q", "-T", "-n"]
+
+# Each process appends a random nonce, so output that happens to contain
+# the bare prefix cannot end a response early
 SENTINEL = "__GAPDONE__"
-SENTINEL_CMD = f'Print("{SENTINEL}\\n");\n'
+_READ_CHUNK = 65536
+
+# Responses longer than this are cut down to their head and tail, with a
+# marker saying how much was left out
+MAX_OUTPUT_BYTES = 256 * 1024
+
+# Run in every new GAP process to warm GAP's method-selection caches on the
+# groups agents ask about most. Wrapped in a function so it binds no globals.
+_WARMUP_CODE = b"""CallFuncList(function()
+  local G;
+  for G in Concatenation(List([3..6], SymmetricGroup), List([4..6], AlternatingGroup),
+                         List([2..12], CyclicGroup)) do
+    Size(G); IsAbelian(G); ConjugacyClasses(G);
+  od;
+end, []);
+"""
 
 # GAP error patterns to detect in stdout (GAP -q sends some errors to stdout)
 ERROR_PATTERNS = [
@@ -39,9 +63,14 @@ BLOCKED_PATTERNS = [
     "Filename(",
 ]
 
+# Each pattern list compiled into one alternation so a single pass finds a hit
+_ERROR_RE = re.compile("|".join(re.escape(p) for p in ERROR_PATTERNS))
+_BLOCKED_RE = re.compile("|".join(re.escape(p) for p in BLOCKED_PATTERNS))
+
 
+@functools.lru_cache(maxsize=1)
 def find_gap_executable() -> str:
-    """Find the GAP executable on this system."""
+    """Find the GAP executable on this system (cached after the first hit)."""
     candidates = [
         os.path.expanduser("~/opt/gap/gap"),
         "/usr/local/bin/gap",
@@ -60,18 +89,216 @@ def find_gap_executable() -> str:
     )
 
 
+def _resolve_executable(path: str) -> str:
+    """
+    Turn a bare command name such as "gap" into a full path via PATH.
+
+    CPython only launches a child with posix_spawn() when the executable
+    has a directory part; a bare name falls back to fork()+exec().
+    """
+    if os.path.dirname(path):
+        return path
+    return shutil.which(path) or path
+
+
 def _contains_blocked(code: str) -> Optional[str]:
     """Return the first blocked pattern found in code, or None."""
-    for pattern in BLOCKED_PATTERNS:
-        if pattern in code:
-            return pattern
-    return None
+    m = _BLOCKED_RE.search(code)
+    return m.group(0) if m else None
+
+
+def _gap_str(value: str) -> str:
+    """Quote a Python string as a GAP string literal."""
+    escaped = value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return f'"{escaped}"'
+
+
+class _GAPProcess:
+    """
+    A single GAP subprocess together with its stdout buffer and stderr file.
+
+    Kept separate from GAPRunner so that a fully started spare process can
+    be swapped in as one object.
+    """
+
+    def __init__(self, gap_executable: str):
+        # stderr goes to an unbuffered temp file: the kernel writes it
+        # directly, so it can never fill a pipe and stall GAP, and it only
+        # needs to be read when a command finishes.
+        self.stderr_file = tempfile.TemporaryFile(buffering=0)
+        self.stderr_pos = 0
+        # Keep the Popen arguments minimal so CPython launches GAP with
+        # posix_spawn() rather than fork()+exec(); that path requires an
+        # executable with a directory part (see _resolve_executable), no
+        # start_new_session/process_group, and close_fds=False, which is
+        # safe because every descriptor Python opens is non-inheritable
+        # (PEP 446).
+        self.popen = subprocess.Popen(
+            [gap_executable, *GAP_OPTIONS],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=self.stderr_file,
+            bufsize=0,
+            close_fds=False,
+        )
+        self.stdin_fd = self.popen.stdin.fileno()
+        self.stdout_fd = self.popen.stdout.fileno()
+        self.stdout_buf = bytearray()
+        sentinel = f"{SENTINEL}{secrets.token_hex(8)}"
+        self.sentinel_cmd = f'Print("{sentinel}\\n");\n'.encode("ascii")
+        self.sentinel_mark = f"{sentinel}\n".encode("ascii")
+        # stdin is written and stdout read in raw chunks whenever the
+        # selector reports them ready, so a large input can never deadlock
+        # against GAP blocking on a full stdout pipe
+        os.set_blocking(self.stdin_fd, False)
+        os.set_blocking(self.stdout_fd, False)
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.stdout_fd, selectors.EVENT_READ)
+
+    def alive(self) -> bool:
+        return self.popen.poll() is None
+
+    def send_sentinel(
+        self, timeout: float, max_bytes: Optional[int] = None, code: bytes = b""
+    ) -> str:
+        """
+        Write code followed by the sentinel command to GAP stdin and return
+        the output produced before the sentinel string appears.
+
+        Writes to stdin are interleaved with reads from stdout as the
+        selector reports each ready, all under the same deadline. stdout is
+        read in raw chunks; the buffer is scanned for the sentinel and
+        decoded once when it is found. With max_bytes, a longer output is
+        truncated to its first and last max_bytes / 2 bytes, and the middle
+        is discarded while reading.
+        """
+        pending = memoryview(code + self.sentinel_cmd)
+        in_fd = self.stdin_fd
+        if pending:
+            self.selector.register(in_fd, selectors.EVENT_WRITE)
+        try:
+            return self._read_until_sentinel(timeout, max_bytes, pending)
+        finally:
+            if in_fd in self.selector.get_map():
+                self.selector.unregister(in_fd)
+
+    def _read_until_sentinel(
+        self, timeout: float, max_bytes: Optional[int], pending: memoryview
+    ) -> str:
+        # Hot loop on large outputs: bind everything it touches to locals
+        fd = self.stdout_fd
+        in_fd = self.stdin_fd
+        write = os.write
+        buf = self.stdout_buf
+        find = buf.find
+        read = os.read
+        select = self.selector.select
+        monotonic = time.monotonic
+        mark = self.sentinel_mark
+        tail = len(mark) - 1
+        deadline = monotonic() + timeout
+        scan_from = 0
+        if max_bytes is not None:
+            head = max_bytes // 2
+            keep_tail = max_bytes - head
+        dropped = 0
+        while True:
+            idx = find(mark, scan_from)
+            if idx != -1:
+                break
+            # The sentinel may straddle two chunks: rescan only the tail
+            scan_from = max(0, len(buf) - tail)
+            remaining = deadline - monotonic()
+            events = select(remaining) if remaining > 0 else None
+            if not events:
+                raise TimeoutError(
+                    f"GAP did not respond within {timeout}s. "
+                    "The computation may be too large; try gap_reset() and use a "
+                    "smaller input, or increase the timeout parameter."
+                )
+            for key, _ in events:
+                if key.fd == in_fd:
+                    try:
+                        pending = pending[write(in_fd, pending):]
+                    except BlockingIOError:
+                        continue
+                    except BrokenPipeError:
+                        raise RuntimeError("GAP process terminated unexpectedly.")
+                    if not pending:
+                        self.selector.unregister(in_fd)
+                    continue
+                try:
+                    chunk = read(fd, _READ_CHUNK)
+                except BlockingIOError:
+                    continue
+                if not chunk:
+                    raise RuntimeError("GAP process terminated unexpectedly.")
+                buf += chunk
+                # Bound memory on huge outputs: drop the scanned middle,
+                # keeping the head and at least keep_tail bytes before the
+                # unscanned part
+                if max_bytes is not None and scan_from - keep_tail - head >= max_bytes:
+                    cut = scan_from - keep_tail - head
+                    del buf[head:head + cut]
+                    dropped += cut
+                    scan_from -= cut
+        if dropped or (max_bytes is not None and idx > max_bytes):
+            omitted = dropped + idx - head - keep_tail
+            output = (
+                buf[:head].decode("utf-8", "replace")
+                + f"\n... [truncated {omitted} bytes] ...\n"
+                + buf[idx - keep_tail:idx].decode("utf-8", "replace")
+            )
+        else:
+            # One decode of the whole response; no per-line strings
+            output = buf[:idx].decode("utf-8", "replace")
+        del buf[:idx + len(mark)]
+        return output
+
+    def drain_stderr(self) -> str:
+        """Return the stderr output written since the previous call."""
+        fd = self.stderr_file.fileno()
+        # pread leaves the file offset shared with GAP untouched
+        size = os.fstat(fd).st_size - self.stderr_pos
+        if size <= 0:
+            return ""
+        data = os.pread(fd, size, self.stderr_pos)
+        self.stderr_pos += len(data)
+        return data.decode("utf-8", "replace").rstrip("\n")
+
+    def close(self):
+        """Terminate the GAP process gracefully."""
+        if self.alive():
+            try:
+                os.write(self.stdin_fd, b"QUIT;\n")
+                self.popen.wait(timeout=3)
+            except Exception:
+                self.popen.kill()
+        self._release()
+
+    def kill(self):
+        """Kill the GAP process at once, e.g. when it is stuck computing."""
+        self.popen.kill()
+        self.popen.wait()
+        self._release()
+
+    def _release(self):
+        """Close the pipes, selector and stderr file of an ended process."""
+        self.selector.close()
+        self.popen.stdin.close()
+        self.popen.stdout.close()
+        self.stderr_file.close()
 
 
 class GAPRunner:
     """
     Manages a persistent GAP process.
 
+    A second, already initialized GAP process is kept on standby so that
+    reset() and the restart after a timeout do not wait for GAP to start.
+    Each new process is first warmed up on a few small standard groups;
+    pass warmup=False to skip that.
+
     Usage:
         runner = GAPRunner()
         result = runner.execute("Order(SymmetricGroup(4));")
@@ -82,138 +309,143 @@ class GAPRunner:
         self,
         gap_executable: Optional[str] = None,
         timeout: int = 60,
+        standby: bool = True,
+        warmup: bool = True,
     ):
         # Resolve executable: explicit arg > env var > auto-detect
-        self.gap_executable = (
+        self.gap_executable = _resolve_executable(
             gap_executable
             or os.environ.get("GAP_EXECUTABLE")
             or find_gap_executable()
         )
         self.default_timeout = timeout
-        self._process: Optional[subprocess.Popen] = None
-        self._stdout_queue: queue.Queue = queue.Queue()
-        self._stderr_queue: queue.Queue = queue.Queue()
-        self._reader_thread: Optional[threading.Thread] = None
-        self._stderr_thread: Optional[threading.Thread] = None
+        self.use_standby = standby
+        self.warmup = warmup
+        self._process: Optional[_GAPProcess] = None
+        self._standby: Optional[_GAPProcess] = None
+        self._standby_thread: Optional[threading.Thread] = None
+        self._standby_lock = threading.Lock()
+        self._loaded_packages: set[str] = set()
         self._lock = threading.Lock()
         self._start()
 
     # ─────────────── lifecycle ───────────────
 
-    def _start(self):
-        """Start the GAP subprocess and wait until it is ready."""
+    def _spawn(self) -> _GAPProcess:
+        """Start a GAP subprocess and wait until it is ready."""
         logger.info("Starting GAP process: %s", self.gap_executable)
-        # Replace queues with fresh ones so any stale EOF signals from
-        # the previous reader threads cannot leak into the new session.
-        self._stdout_queue = queue.Queue()
-        self._stderr_queue = queue.Queue()
-
-        self._process = subprocess.Popen(
-            [self.gap_executable, "-q"],
-            stdin=subprocess.PIPE,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            bufsize=1,
-        )
-        # Background threads read stdout and stderr continuously
-        self._reader_thread = threading.Thread(
-            target=self._read_stream,
-            args=(self._process.stdout, self._stdout_queue),
-            daemon=True,
-        )
-        self._stderr_thread = threading.Thread(
-            target=self._read_stream,
-            args=(self._process.stderr, self._stderr_queue),
-            daemon=True,
-        )
-        self._reader_thread.start()
-        self._stderr_thread.start()
-
-        # Wait for GAP to become ready using the sentinel (no sleep needed)
-        self._send_sentinel(timeout=30)
+        proc = _GAPProcess(self.gap_executable)
+        try:
+            # Wait for GAP to become ready using the sentinel (no sleep needed)
+            proc.send_sentinel(timeout=30)
+            if self.warmup:
+                proc.send_sentinel(timeout=30, code=_WARMUP_CODE)
+                proc.drain_stderr()
+        except Exception:
+            proc.close()
+            raise
         logger.info("GAP process ready.")
+        return proc
 
-    def _read_stream(self, stream, q: queue.Queue):
-        """Background thread: read a stream line by line into a queue."""
-        for line in stream:
-            q.put(line)
-        q.put(None)  # EOF signal
+    def _start(self):
+        """Make a ready GAP process active, preferring the warm standby."""
+        self._loaded_packages = set()
+        if not self._swap_standby():
+            self._process = self._spawn()
+            self._start_prewarm()
+
+    def _start_prewarm(self):
+        if not self.use_standby:
+            return
+        self._standby_thread = threading.Thread(
+            target=self._prewarm_standby, daemon=True
+        )
+        self._standby_thread.start()
+
+    def _prewarm_standby(self):
+        """Background thread: start a spare GAP process for fast restarts."""
+        try:
+            proc = self._spawn()
+        except Exception:
+            logger.warning("Could not start standby GAP process.", exc_info=True)
+            return
+        with self._standby_lock:
+            self._standby = proc
+
+    def _swap_standby(self) -> bool:
+        """Promote the standby process to active; return False if none is ready."""
+        # A standby that is still starting is never slower than a fresh spawn
+        if self._standby_thread is not None:
+            self._standby_thread.join()
+            self._standby_thread = None
+        with self._standby_lock:
+            proc, self._standby = self._standby, None
+        if proc is None:
+            return False
+        if not proc.alive():
+            proc.close()
+            return False
+        self._process = proc
+        self._start_prewarm()
+        return True
+
+    def _stop(self, kill: bool = False):
+        """
+        Terminate the active GAP process, leaving the standby in place.
 
-    def close(self):
-        """Terminate the GAP process gracefully."""
-        if self._process and self._process.poll() is None:
-            try:
-                self._process.stdin.write("QUIT;\n")
-                self._process.stdin.flush()
-                self._process.wait(timeout=3)
-            except Exception:
+        With kill=True the process is killed without asking it to QUIT
+        first, for a GAP that is busy or no longer reading its input.
+        """
+        if self._process is not None:
+            if kill:
                 self._process.kill()
+            else:
+                self._process.close()
         self._process = None
+
+    def close(self):
+        """Terminate the GAP process (and its standby) gracefully."""
+        self._stop()
+        if self._standby_thread is not None:
+            self._standby_thread.join()
+            self._standby_thread = None
+        with self._standby_lock:
+            proc, self._standby = self._standby, None
+        if proc is not None:
+            proc.close()
         logger.info("GAP process closed.")
 
     def reset(self) -> dict:
         """Restart the GAP process, clearing all variable state."""
         with self._lock:
-            self.close()
+            self._stop()
             self._start()
         return {"success": True, "output": "GAP session reset.", "error": None}
 
     # ─────────────── internal helpers ───────────────
 
-    def _send_sentinel(self, timeout: Optional[int] = None) -> list:
-        """
-        Write the sentinel command to GAP stdin and collect output
-        lines until the sentinel string appears.
-        """
-        self._process.stdin.write(SENTINEL_CMD)
-        self._process.stdin.flush()
-        t = timeout or self.default_timeout
-        lines = []
-        while True:
-            try:
-                line = self._stdout_queue.get(timeout=t)
-            except queue.Empty:
-                raise TimeoutError(
-                    f"GAP did not respond within {t}s. "
-                    "The computation may be too large; try gap_reset() and use a "
-                    "smaller input, or increase the timeout parameter."
-                )
-            if line is None:
-                raise RuntimeError("GAP process terminated unexpectedly.")
-            stripped = line.rstrip("\n")
-            if stripped == SENTINEL:
-                break
-            lines.append(stripped)
-        return lines
-
-    def _drain_stderr(self) -> str:
-        """Collect all currently available stderr lines without blocking."""
-        lines = []
-        while True:
-            try:
-                line = self._stderr_queue.get_nowait()
-                if line is None:
-                    break
-                lines.append(line.rstrip("\n"))
-            except queue.Empty:
-                break
-        return "\n".join(lines)
-
     def _has_error(self, stdout: str, stderr: str) -> Optional[str]:
         """Return an error message if any error pattern is detected."""
-        combined = stdout + "\n" + stderr
-        for pattern in ERROR_PATTERNS:
-            if pattern in combined:
-                return combined.strip()
+        # Search each stream in place; only build the message on a hit
+        if _ERROR_RE.search(stdout) or _ERROR_RE.search(stderr):
+            return (stdout + "\n" + stderr).strip()
         return None
 
     # ─────────────── public API ───────────────
 
-    def execute(self, code: str, timeout: Optional[int] = None) -> dict:
+    def execute(
+        self,
+        code: str,
+        timeout: Optional[int] = None,
+        max_bytes: Optional[int] = MAX_OUTPUT_BYTES,
+    ) -> dict:
         """
         Execute GAP code and return a result dict.
 
+        Output longer than max_bytes (default MAX_OUTPUT_BYTES) is cut down
+        to its head and tail around a "[truncated N bytes]" marker; pass
+        max_bytes=None to get the full output.
+
         Returns:
             {
                 "success": bool,
@@ -232,10 +464,13 @@ class GAPRunner:
                     "Use gap_reset() to restart the session instead of QUIT."
                 ),
             }
+        if not code.strip():
+            return {"success": True, "output": "", "error": None}
 
         with self._lock:
-            if self._process is None or self._process.poll() is not None:
+            if self._process is None or not self._process.alive():
                 logger.warning("GAP process is dead — restarting.")
+                self._stop()
                 self._start()
 
             # Normalize code: strip trailing whitespace but do NOT blindly
@@ -243,20 +478,23 @@ class GAPRunner:
             # need one and it would break them.
             full_code = code.strip() + "\n"
             try:
-                self._process.stdin.write(full_code)
-                self._process.stdin.flush()
-                lines = self._send_sentinel(timeout)
+                output = self._process.send_sentinel(
+                    timeout or self.default_timeout,
+                    max_bytes=max_bytes,
+                    code=full_code.encode("utf-8"),
+                )
             except TimeoutError as exc:
-                # Restart so the server stays usable
-                self.close()
+                # GAP is still busy and would ignore QUIT: kill it and swap
+                # in the standby so the server stays usable
+                self._stop(kill=True)
                 self._start()
                 return {"success": False, "output": "", "error": str(exc)}
             except RuntimeError as exc:
-                self._process = None
+                self._stop(kill=True)
                 return {"success": False, "output": "", "error": str(exc)}
 
-            output = "\n".join(lines).strip()
-            stderr = self._drain_stderr()
+            output = output.strip()
+            stderr = self._process.drain_stderr()
             error = self._has_error(output, stderr)
 
             return {
@@ -265,6 +503,23 @@ class GAPRunner:
                 "error": error,
             }
 
+    def load_package(self, name: str, timeout: Optional[int] = None) -> dict:
+        """
+        Load a GAP package into the current session.
+
+        The output is the value returned by LoadPackage ("true" or "fail").
+        A package already loaded in this session returns "true" without
+        contacting GAP.
+        """
+        if name in self._loaded_packages:
+            return {"success": True, "output": "true", "error": None}
+        result = self.execute(f"LoadPackage({_gap_str(name)});", timeout=timeout)
+        # Package banners, if any, precede LoadPackage's return value
+        if result["success"] and result["output"].endswith("true"):
+            result["output"] = "true"
+            self._loaded_packages.add(name)
+        return result
+
 
 # ─── Module-level singleton with thread-safe initialization ───
 
@@ -0,0 +1,139 @@
+"""
+Pool of GAP runners — lets independent tool calls run in parallel.
+
+Each pooled runner owns its own GAP process. A caller borrows one for the
+duration of a call, so concurrent calls no longer queue on a single
+subprocess. Runners are started lazily, up to a fixed maximum.
+"""
+
+import asyncio
+import contextlib
+import threading
+from typing import AsyncIterator, Optional, Sequence
+
+from .gap_runner import GAPRunner
+
+
+class GAPPool:
+    """
+    Pool of up to max_size persistent GAP runners.
+
+    When a runner is returned, the given scratch variables are unbound
+    instead of restarting GAP, which keeps its method-selection caches warm.
+    A runner whose process died is restarted by GAPRunner.execute() itself
+    on its next call. Packages registered with add_package() are loaded into
+    each runner before it is lent out.
+
+    Usage:
+        pool = GAPPool(max_size=4, scratch_vars=["G", "H"])
+        async with pool.acquire() as runner:
+            result = await asyncio.to_thread(runner.execute, code)
+        pool.close()
+    """
+
+    def __init__(
+        self,
+        max_size: int = 4,
+        scratch_vars: Sequence[str] = (),
+        gap_executable: Optional[str] = None,
+    ):
+        if max_size < 1:
+            raise ValueError(f"max_size must be at least 1, got {max_size}")
+        self.max_size = max_size
+        self.gap_executable = gap_executable
+        self._scrub_code = (
+            "Perform([" + ", ".join(f'"{name}"' for name in scratch_vars) + "], "
+            "function(v) if IsBoundGlobal(v) then UnbindGlobal(v); fi; end);"
+            if scratch_vars else ""
+        )
+        self._free: asyncio.Queue[GAPRunner] = asyncio.Queue()
+        # Runners started outside the event loop by prestart()
+        self._prestarted: list[GAPRunner] = []
+        self._runners: list[GAPRunner] = []
+        self._packages: list[str] = []
+        self._size = 0
+        self._size_lock = threading.Lock()
+
+    # ─────────────── lifecycle ───────────────
+
+    def _new_runner(self) -> GAPRunner:
+        """Start a runner (blocking). The caller has already reserved a slot."""
+        try:
+            # Pool members skip the warm standby: the pool itself provides
+            # spare processes.
+            runner = GAPRunner(self.gap_executable, standby=False)
+        except BaseException:
+            with self._size_lock:
+                self._size -= 1
+            raise
+        self._runners.append(runner)
+        return runner
+
+    def _reserve(self) -> bool:
+        with self._size_lock:
+            if self._size >= self.max_size:
+                return False
+            self._size += 1
+            return True
+
+    def prestart(self) -> None:
+        """
+        Start one runner ahead of the first call, if there is room.
+
+        Blocks while GAP starts; meant to be called from a worker thread.
+        """
+        if self._reserve():
+            self._prestarted.append(self._new_runner())
+
+    def add_package(self, name: str) -> None:
+        """Load the GAP package name into every runner lent out from now on."""
+        if name not in self._packages:
+            self._packages.append(name)
+
+    def _load_packages(self, runner: GAPRunner) -> None:
+        # Cheap once loaded: GAPRunner.load_package() remembers its packages
+        for name in self._packages:
+            runner.load_package(name)
+
+    def close(self) -> None:
+        """Terminate every runner the pool has started."""
+        for runner in self._runners:
+            runner.close()
+        self._runners.clear()
+        self._prestarted.clear()
+        self._free = asyncio.Queue()
+        with self._size_lock:
+            self._size = 0
+
+    # ─────────────── borrowing ───────────────
+
+    @contextlib.asynccontextmanager
+    async def acquire(self) -> AsyncIterator[GAPRunner]:
+        """Borrow a runner for the duration of the ``async with`` block."""
+        runner = await self._get()
+        try:
+            if self._packages:
+                await asyncio.to_thread(self._load_packages, runner)
+            yield runner
+        finally:
+            await self._release(runner)
+
+    async def _get(self) -> GAPRunner:
+        try:
+            return self._free.get_nowait()
+        except asyncio.QueueEmpty:
+            pass
+        try:
+            return self._prestarted.pop()
+        except IndexError:
+            pass
+        if self._reserve():
+            return await asyncio.to_thread(self._new_runner)
+        return await self._free.get()
+
+    async def _release(self, runner: GAPRunner) -> None:
+        try:
+            if self._scrub_code:
+                await asyncio.to_thread(runner.execute, self._scrub_code)
+        finally:
+            self._free.put_nowait(runner)
@@ -6,10 +6,19 @@ allowing Claude and other LLM clients to perform exact symbolic computations
 in group theory, representation theory, and computational discrete algebra.
 """
 
+import argparse
+import asyncio
+import functools
 import logging
 import os
+import threading
+from collections import OrderedDict
+from string import Template
+from typing import Optional
 from mcp.server.fastmcp import FastMCP
+from mcp.server.fastmcp.tools import Tool
 from .gap_runner import get_runner
+from .pool import GAPPool
 
 logger = logging.getLogger(__name__)
 
@@ -26,23 +35,164 @@ mcp = FastMCP(
         "specialized tools for common operations. GAP uses multiplicative notation "
         "for groups by default. Elements are permutations written as Cycles, "
         "e.g. (1,2,3). Statements must end with semicolons. "
-        "Always prefer specialized tools over gap_eval when available."
+        "Always prefer specialized tools over gap_eval when available. "
+        "The specialized tools run in separate GAP workers, so their group "
+        "arguments cannot refer to variables defined with gap_eval."
     ),
 )
 
+# Global variables assigned by the specialized tools' scripts. They are
+# unbound whenever a pool worker is returned, so every call starts clean.
+_SCRATCH_VARS = (
+    "G", "H", "p", "S", "nS", "cZ", "ordG", "ordZ", "ord", "o", "g", "ns",
+    "L", "isNorm", "T", "ds", "cs", "i", "cls", "c", "phi", "inv", "A", "inn",
+    "ordH", "ordA", "ordInn",
+)
+
+# The specialized tools borrow workers from this pool, so independent calls
+# run in parallel. gap_eval, gap_batch, gap_load_package and gap_reset act on
+# the shared session returned by get_runner() instead.
+# Its size is set by main() from --pool-size or GAP_MCP_POOL_SIZE.
+_pool = GAPPool(scratch_vars=_SCRATCH_VARS)
+
+
+def _pool_size(value: str) -> int:
+    """Parse a pool size from the command line or environment."""
+    try:
+        size = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f"pool size must be an integer, got {value!r}"
+        ) from None
+    if size < 1:
+        raise argparse.ArgumentTypeError(f"pool size must be at least 1, got {size}")
+    return size
+
+
+# ─────────────────────────────────────────────
+# GAP script helpers
+# ─────────────────────────────────────────────
+
+def _emit_props(props: list[tuple[str, str]], indent: str = "", align: bool = False) -> str:
+    """
+    Build a single GAP Print statement that outputs one "label: value" line
+    per (label, GAP expression) pair. With align=True the values line up.
+    """
+    width = max(len(label) for label, _ in props) + 2 if align else 0
+    args = [f'"{(label + ": ").ljust(width)}", {expr}, "\\n"' for label, expr in props]
+    return f"{indent}Print(" + f",\n{indent}      ".join(args) + ");"
+
+
+def _finalize(result: dict) -> str:
+    """Format a GAPRunner result dict as the text a tool returns."""
+    if result["success"]:
+        return result["output"] or "(no output)"
+    return f"GAP Error:\n{result['error']}"
+
+
+_CLOSING = {")": "(", "]": "[", "}": "{"}
+
+
+def _check_group_expr(expr: str) -> Optional[str]:
+    """
+    Return why expr cannot be a single GAP expression, or None if it may be.
+
+    Only catches what is certain to fail or to break out of the script
+    template (empty input, unbalanced brackets or quotes, '#'); anything else,
+    including the ';' inside function literals, is left for GAP to judge.
+    """
+    if not expr.strip():
+        return "it is empty"
+    stack: list[str] = []
+    quote = None
+    escaped = False
+    for ch in expr:
+        if quote:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == quote:
+                quote = None
+        elif ch in "\"'":
+            quote = ch
+        elif ch in "([{":
+            stack.append(ch)
+        elif ch in _CLOSING:
+            if not stack or stack.pop() != _CLOSING[ch]:
+                return f"unbalanced '{ch}'"
+        elif ch == "#":
+            # A comment would swallow the ';' the template puts after it
+            return "it must not contain a '#' comment"
+    if quote:
+        return "unterminated string"
+    if stack:
+        return f"unclosed '{stack[-1]}'"
+    return None
+
+
+# ─────────────────────────────────────────────
+# Result cache for the specialized tools
+# ─────────────────────────────────────────────
+
+# The specialized tools are pure functions of their arguments, and their GAP
+# script is a deterministic function of those arguments, so the script itself
+# is the cache key. Only successful results are kept. Loading a package can
+# install new methods and change what a script prints, so gap_load_package
+# clears the cache, as does gap_reset.
+_CACHE_SIZE = 512
+_result_cache: OrderedDict[str, dict] = OrderedDict()
+
+
+async def _execute_cached(code: str, timeout: Optional[int] = None) -> dict:
+    """Run a tool script on a pool worker, reusing an identical earlier run."""
+    result = _result_cache.get(code)
+    if result is not None:
+        _result_cache.move_to_end(code)
+        return result
+    async with _pool.acquire() as runner:
+        result = await asyncio.to_thread(runner.execute, code, timeout=timeout)
+    if result["success"]:
+        _result_cache[code] = result
+        if len(_result_cache) > _CACHE_SIZE:
+            _result_cache.popitem(last=False)
+    return result
+
+
+async def _run(tpl: Template, timeout: Optional[int] = None, **params) -> str:
+    """
+    Fill in a specialized tool's script, run it and format the result with
+    _finalize(). Parameters named group_expr* are preflight-checked first, so
+    malformed input is reported without a GAP round-trip.
+    """
+    for name, value in params.items():
+        if name.startswith("group_expr"):
+            problem = _check_group_expr(value)
+            if problem:
+                return f"GAP Error:\nInvalid {name} {value!r}: {problem}."
+    return _finalize(await _execute_cached(tpl.substitute(params), timeout=timeout))
+
+
+def _clear_cache() -> None:
+    """Forget all cached tool results."""
+    _result_cache.clear()
+
 
 # ─────────────────────────────────────────────
 # Tool 1: Arbitrary GAP code execution
 # ─────────────────────────────────────────────
 
 @mcp.tool()
-def gap_eval(code: str, timeout: int = 30) -> str:
+async def gap_eval(code: str, timeout: int = 30) -> str:
     """
     Execute arbitrary GAP code and return the output.
 
     Use this for any GAP computation not covered by the specialized tools.
     GAP uses multiplicative notation. Statements must end with semicolons.
     Multiline code (for/od, if/fi, etc.) is supported.
+    Output longer than 256 KiB is cut down to its first and last 128 KiB
+    around a "[truncated N bytes]" marker; print less (e.g. sizes or a
+    sample instead of full element lists) when you need all of it.
 
     Args:
         code:    Valid GAP code. May be multiline.
@@ -54,19 +204,51 @@ def gap_eval(code: str, timeout: int = 30) -> str:
         gap_eval('IsPrime(104729);')                    -> 'true'
         gap_eval('for i in [1..5] do Print(i,"\\n"); od;')
     """
-    runner = get_runner()
-    result = runner.execute(code, timeout=timeout)
-    if not result["success"]:
-        return f"GAP Error:\n{result['error']}"
-    return result["output"] or "(no output)"
+    runner = await asyncio.to_thread(get_runner)
+    return _finalize(await asyncio.to_thread(runner.execute, code, timeout=timeout))
 
 
 # ─────────────────────────────────────────────
 # Tool 2: Group information
 # ─────────────────────────────────────────────
 
+_GROUP_INFO_PROPS = _emit_props([
+    ("Order", "Order(G)"),
+    ("IsAbelian", "IsAbelian(G)"),
+    ("IsSimple", "IsSimple(G)"),
+    ("IsSolvable", "IsSolvable(G)"),
+    ("IsNilpotent", "IsNilpotentGroup(G)"),
+])
+
+# Printed separately, so a group whose conjugacy classes cannot be computed
+# (e.g. an infinite fp group) still reports the properties above. For an
+# abelian group every element is its own class: its exponent and class count
+# come from GAP's abelian methods without enumerating |G| classes. Otherwise
+# both are read off one ConjugacyClasses call, instead of GAP's own Exponent
+# method, which can be very slow.
+_GROUP_INFO_ABELIAN_PROPS = _emit_props([
+    ("Exponent", "Exponent(G)"),
+    ("NrConjugacyClasses", "Size(G)"),
+], indent="  ")
+_GROUP_INFO_CLASS_PROPS = _emit_props([
+    ("Exponent", "Lcm(List(cls, c -> Order(Representative(c))))"),
+    ("NrConjugacyClasses", "Length(cls)"),
+], indent="  ")
+
+_GROUP_INFO_TPL = Template("""
+G := $group_expr;
+""" + _GROUP_INFO_PROPS + """
+if IsAbelian(G) then
+""" + _GROUP_INFO_ABELIAN_PROPS + """
+else
+  cls := ConjugacyClasses(G);
+""" + _GROUP_INFO_CLASS_PROPS + """
+fi;
+""")
+
+
 @mcp.tool()
-def gap_group_info(group_expr: str) -> str:
+async def gap_group_info(group_expr: str) -> str:
     """
     Return a structured summary of key properties of a group.
 
@@ -79,44 +261,27 @@ def gap_group_info(group_expr: str) -> str:
                               'DihedralGroup(8)', 'AlternatingGroup(5)',
                               'SmallGroup(16,5)', 'GL(2,3)'
     """
-    code = f"""
-G := {group_expr};
-Print("Order: ", Order(G), "\\n");
-Print("IsAbelian: ", IsAbelian(G), "\\n");
-Print("IsSimple: ", IsSimple(G), "\\n");
-Print("IsSolvable: ", IsSolvable(G), "\\n");
-Print("IsNilpotent: ", IsNilpotentGroup(G), "\\n");
-Print("Exponent: ", Exponent(G), "\\n");
-Print("NrConjugacyClasses: ", NrConjugacyClasses(G), "\\n");
-"""
-    result = get_runner().execute(code)
-    if not result["success"]:
-        return f"GAP Error:\n{result['error']}"
-    return result["output"]
+    return await _run(_GROUP_INFO_TPL, group_expr=group_expr)
 
 
 # ─────────────────────────────────────────────
 # Tool 3: Group elements
 # ─────────────────────────────────────────────
 
-@mcp.tool()
-def gap_elements(group_expr: str, max_order: int = 24) -> str:
-    """
-    List elements and their orders in a group.
-
-    For large groups (order > max_order), only generators are shown.
+# Hard limit on listed elements, whatever max_order asks for, so GAP never
+# builds an element list whose printout would only be truncated
+_MAX_LISTED_ELEMENTS = 4096
 
-    Args:
-        group_expr: GAP group expression.
-        max_order:  Maximum group order to list all elements (default 24).
-    """
-    code = f"""
-G := {group_expr};
+_ELEMENTS_TPL = Template("""
+G := $group_expr;
 ord := Order(G);
-if ord <= {max_order} then
-  elts := Elements(G);
-  for g in elts do
-    Print(g, " (order ", Order(g), ")\\n");
+if ord <= $max_order then
+  # Conjugate elements share their order: compute it once per class
+  for c in ConjugacyClasses(G) do
+    o := Order(Representative(c));
+    for g in AsList(c) do
+      Print(g, " (order ", o, ")\\n");
+    od;
   od;
 else
   Print("Group too large (order ", ord, ") to list all elements.\\n");
@@ -125,42 +290,42 @@ else
     Print("  ", g, "\\n");
   od;
 fi;
-"""
-    result = get_runner().execute(code)
-    if not result["success"]:
-        return f"GAP Error:\n{result['error']}"
-    return result["output"]
-
+""")
 
-# ─────────────────────────────────────────────
-# Tool 4: Subgroups
-# ─────────────────────────────────────────────
 
 @mcp.tool()
-def gap_subgroups(group_expr: str, normal_only: bool = False) -> str:
+async def gap_elements(group_expr: str, max_order: int = 24) -> str:
     """
-    Compute subgroups (or normal subgroups) of a group.
+    List elements and their orders in a group, grouped by conjugacy class.
 
-    Warning: AllSubgroups is expensive for groups of order > 100.
-    For large groups use normal_only=True or gap_sylow/gap_derived_series.
+    For large groups (order > max_order), only generators are shown.
 
     Args:
-        group_expr:  GAP group expression.
-        normal_only: If True, return only normal subgroups (faster).
+        group_expr: GAP group expression.
+        max_order:  Maximum group order to list all elements (default 24,
+                    at most 4096).
     """
-    if normal_only:
-        code = f"""
-G := {group_expr};
+    return await _run(
+        _ELEMENTS_TPL, group_expr=group_expr, max_order=min(max_order, _MAX_LISTED_ELEMENTS)
+    )
+
+
+# ─────────────────────────────────────────────
+# Tool 4: Subgroups
+# ─────────────────────────────────────────────
+
+_NORMAL_SUBGROUPS_TPL = Template("""
+G := $group_expr;
 ns := NormalSubgroups(G);
 Print("Normal subgroups of G (order ", Order(G), "):\\n");
 for H in ns do
   Print("  Order ", Order(H), ": ", H, "\\n");
 od;
 Print("Total: ", Length(ns), " normal subgroups\\n");
-"""
-    else:
-        code = f"""
-G := {group_expr};
+""")
+
+_SUBGROUPS_TPL = Template("""
+G := $group_expr;
 ord := Order(G);
 if ord > 500 then
   Print("Warning: group order ", ord, " is large. Use normal_only=True or ");
@@ -171,28 +336,53 @@ if ord > 500 then
     Print("  Order ", Order(H), " [normal]: ", H, "\\n");
   od;
 else
-  sub := AllSubgroups(G);
-  Print("Subgroups of G (order ", ord, "):\\n");
-  for H in sub do
+  L := LatticeSubgroups(G);
+  cls := ConjugacyClassesSubgroups(L);
+  Print("Subgroups of G (order ", ord, ") up to conjugacy:\\n");
+  for c in cls do
+    H := Representative(c);
     isNorm := "";
-    if IsNormal(G, H) then isNorm := " [normal]"; fi;
-    Print("  Order ", Order(H), isNorm, ": ", H, "\\n");
+    if Size(c) = 1 then isNorm := " [normal]"; fi;
+    Print("  Order ", Order(H), ", class size ", Size(c), isNorm, ": ", H, "\\n");
   od;
-  Print("Total: ", Length(sub), " subgroups\\n");
+  Print("Total: ", Sum(cls, Size), " subgroups in ", Length(cls),
+        " conjugacy classes\\n");
 fi;
-"""
-    result = get_runner().execute(code, timeout=90)
-    if not result["success"]:
-        return f"GAP Error:\n{result['error']}"
-    return result["output"]
+""")
+
+
+@mcp.tool()
+async def gap_subgroups(group_expr: str, normal_only: bool = False) -> str:
+    """
+    Compute subgroups (or normal subgroups) of a group.
+
+    Subgroups are listed up to conjugacy, from the subgroup lattice: one
+    representative per class with the class size. A class of size 1 is a
+    normal subgroup. The lattice is still expensive for groups of order
+    > 100; for large groups use normal_only=True or
+    gap_sylow/gap_derived_series.
+
+    Args:
+        group_expr:  GAP group expression.
+        normal_only: If True, return only normal subgroups (faster).
+    """
+    tpl = _NORMAL_SUBGROUPS_TPL if normal_only else _SUBGROUPS_TPL
+    return await _run(tpl, timeout=90, group_expr=group_expr)
 
 
 # ─────────────────────────────────────────────
 # Tool 5: Character table
 # ─────────────────────────────────────────────
 
+_CHARACTER_TABLE_TPL = Template("""
+G := $group_expr;
+T := CharacterTable(G);
+Display(T);
+""")
+
+
 @mcp.tool()
-def gap_character_table(group_expr: str) -> str:
+async def gap_character_table(group_expr: str) -> str:
     """
     Compute and display the character table of a group.
 
@@ -205,23 +395,40 @@ def gap_character_table(group_expr: str) -> str:
         gap_character_table('SymmetricGroup(4)')   -> full character table of S4
         gap_character_table('AlternatingGroup(5)') -> character table of A5
     """
-    code = f"""
-G := {group_expr};
-T := CharacterTable(G);
-Display(T);
-"""
-    result = get_runner().execute(code, timeout=60)
-    if not result["success"]:
-        return f"GAP Error:\n{result['error']}"
-    return result["output"]
+    return await _run(_CHARACTER_TABLE_TPL, timeout=60, group_expr=group_expr)
 
 
 # ─────────────────────────────────────────────
 # Tool 6: Sylow subgroups
 # ─────────────────────────────────────────────
 
+_SYLOW_TPL = Template("""
+G := $group_expr;
+p := $prime;
+if not IsPrime(p) then
+  Print("Error: ", p, " is not prime.\\n");
+else
+  S := SylowSubgroup(G, p);
+  nS := Length(ConjugateSubgroups(G, S));
+$props
+fi;
+""")
+
+
+@functools.lru_cache(maxsize=32)
+def _sylow_props(prime: int) -> str:
+    # The labels mention the prime, so the aligned Print is built per prime
+    return _emit_props([
+        ("Group order", "Order(G)"),
+        (f"Sylow {prime}-subgroup order", "Order(S)"),
+        (f"Number of Sylow {prime}-subgroups", "nS"),
+        ("Is normal", "IsNormal(G, S)"),
+        ("Sylow subgroup", "S"),
+    ], indent="  ", align=True)
+
+
 @mcp.tool()
-def gap_sylow(group_expr: str, prime: int) -> str:
+async def gap_sylow(group_expr: str, prime: int) -> str:
     """
     Compute the Sylow p-subgroup of a group and verify Sylow's theorems.
 
@@ -232,44 +439,15 @@ def gap_sylow(group_expr: str, prime: int) -> str:
         group_expr: GAP group expression.
         prime:      A prime number p.
     """
-    code = f"""
-G := {group_expr};
-p := {prime};
-if not IsPrime(p) then
-  Print("Error: ", p, " is not prime.\\n");
-else
-  S := SylowSubgroup(G, p);
-  nS := Length(ConjugateSubgroups(G, S));
-  Print("Group order:                ", Order(G), "\\n");
-  Print("Sylow ", p, "-subgroup order: ", Order(S), "\\n");
-  Print("Number of Sylow ", p, "-subgroups: ", nS, "\\n");
-  Print("Is normal:                  ", IsNormal(G, S), "\\n");
-  Print("Sylow subgroup:             ", S, "\\n");
-fi;
-"""
-    result = get_runner().execute(code)
-    if not result["success"]:
-        return f"GAP Error:\n{result['error']}"
-    return result["output"]
+    return await _run(_SYLOW_TPL, group_expr=group_expr, prime=prime, props=_sylow_props(prime))
 
 
 # ─────────────────────────────────────────────
 # Tool 7: Center
 # ─────────────────────────────────────────────
 
-@mcp.tool()
-def gap_center(group_expr: str) -> str:
-    """
-    Compute the center Z(G) of a group.
-
-    Reports order, generators, and whether G/Z(G) is cyclic.
-    Elements are only listed for small centers (order ≤ 20).
-
-    Args:
-        group_expr: GAP group expression.
-    """
-    code = f"""
-G := {group_expr};
+_CENTER_TPL = Template("""
+G := $group_expr;
 cZ := Center(G);
 ordG := Order(G);
 ordZ := Order(cZ);
@@ -290,29 +468,29 @@ elif ordZ = 1 then
 else
   Print("G/Z(G) is cyclic: ", IsCyclic(G/cZ), "\\n");
 fi;
-"""
-    result = get_runner().execute(code)
-    if not result["success"]:
-        return f"GAP Error:\n{result['error']}"
-    return result["output"]
+""")
 
 
-# ─────────────────────────────────────────────
-# Tool 8: Derived series and solvability
-# ─────────────────────────────────────────────
-
 @mcp.tool()
-def gap_derived_series(group_expr: str) -> str:
+async def gap_center(group_expr: str) -> str:
     """
-    Compute the derived series and composition series of a group.
+    Compute the center Z(G) of a group.
 
-    Useful for determining solvability and the Jordan-Hölder structure.
+    Reports order, generators, and whether G/Z(G) is cyclic.
+    Elements are only listed for small centers (order ≤ 20).
 
     Args:
         group_expr: GAP group expression.
     """
-    code = f"""
-G := {group_expr};
+    return await _run(_CENTER_TPL, group_expr=group_expr)
+
+
+# ─────────────────────────────────────────────
+# Tool 8: Derived series and solvability
+# ─────────────────────────────────────────────
+
+_DERIVED_SERIES_TPL = Template("""
+G := $group_expr;
 ds := DerivedSeriesOfGroup(G);
 Print("Derived series (length ", Length(ds), "):\\n");
 for i in [1..Length(ds)] do
@@ -324,31 +502,28 @@ Print("Composition series (length ", Length(cs), "):\\n");
 for i in [1..Length(cs)] do
   Print("  order ", Order(cs[i]), "\\n");
 od;
-"""
-    result = get_runner().execute(code, timeout=60)
-    if not result["success"]:
-        return f"GAP Error:\n{result['error']}"
-    return result["output"]
-
+""")
 
-# ─────────────────────────────────────────────
-# Tool 9: Conjugacy classes
-# ─────────────────────────────────────────────
 
 @mcp.tool()
-def gap_conjugacy_classes(group_expr: str) -> str:
+async def gap_derived_series(group_expr: str) -> str:
     """
-    List conjugacy classes with a representative and size for each.
+    Compute the derived series and composition series of a group.
+
+    Useful for determining solvability and the Jordan-Hölder structure.
 
     Args:
         group_expr: GAP group expression.
-
-    Examples:
-        gap_conjugacy_classes('SymmetricGroup(4)') -> 5 classes of S4
-        gap_conjugacy_classes('AlternatingGroup(5)') -> 5 classes of A5
     """
-    code = f"""
-G := {group_expr};
+    return await _run(_DERIVED_SERIES_TPL, timeout=60, group_expr=group_expr)
+
+
+# ─────────────────────────────────────────────
+# Tool 9: Conjugacy classes
+# ─────────────────────────────────────────────
+
+_CONJUGACY_CLASSES_TPL = Template("""
+G := $group_expr;
 cls := ConjugacyClasses(G);
 Print("Conjugacy classes of G (order ", Order(G), "):\\n");
 for c in cls do
@@ -356,42 +531,51 @@ for c in cls do
         "  order=", Order(Representative(c)), "\\n");
 od;
 Print("Total: ", Length(cls), " classes\\n");
-"""
-    result = get_runner().execute(code)
-    if not result["success"]:
-        return f"GAP Error:\n{result['error']}"
-    return result["output"]
+""")
 
 
-# ─────────────────────────────────────────────
-# Tool 10: Isomorphism testing
-# ─────────────────────────────────────────────
-
 @mcp.tool()
-def gap_isomorphism(group_expr1: str, group_expr2: str) -> str:
+async def gap_conjugacy_classes(group_expr: str) -> str:
     """
-    Test whether two groups are isomorphic and, if so, exhibit an isomorphism.
+    List conjugacy classes with a representative and size for each.
 
     Args:
-        group_expr1: GAP expression for the first group.
-        group_expr2: GAP expression for the second group.
+        group_expr: GAP group expression.
 
     Examples:
-        gap_isomorphism('SymmetricGroup(3)', 'DihedralGroup(6)')  -> isomorphic
-        gap_isomorphism('CyclicGroup(4)', 'DihedralGroup(4)')     -> not isomorphic
-        gap_isomorphism('SmallGroup(8,3)', 'QuaternionGroup(8)')  -> check Q8 vs D4
+        gap_conjugacy_classes('SymmetricGroup(4)') -> 5 classes of S4
+        gap_conjugacy_classes('AlternatingGroup(5)') -> 5 classes of A5
     """
-    code = f"""
-G := {group_expr1};
-H := {group_expr2};
-if Order(G) <> Order(H) then
-  Print("Not isomorphic (different orders: ", Order(G), " vs ", Order(H), ").\\n");
+    return await _run(_CONJUGACY_CLASSES_TPL, group_expr=group_expr)
+
+
+# ─────────────────────────────────────────────
+# Tool 10: Isomorphism testing
+# ─────────────────────────────────────────────
+
+# Equal orders and abelian invariants already make an abelian G isomorphic
+# to H (H/H' then has order |H|, so H is abelian too); the class profile is
+# only compared for non-abelian groups, where it does not enumerate |G| classes.
+_ISOMORPHISM_TPL = Template("""
+G := $group_expr1;
+H := $group_expr2;
+ordG := Order(G);
+ordH := Order(H);
+if ordG <> ordH then
+  Print("Not isomorphic (different orders: ", ordG, " vs ", ordH, ").\\n");
+elif AbelianInvariants(G) <> AbelianInvariants(H) then
+  Print("Not isomorphic (different abelian invariants: ", AbelianInvariants(G),
+        " vs ", AbelianInvariants(H), ").\\n");
+elif not IsAbelian(G)
+     and Collected(List(ConjugacyClasses(G), c -> [Size(c), Order(Representative(c))]))
+     <> Collected(List(ConjugacyClasses(H), c -> [Size(c), Order(Representative(c))])) then
+  Print("Not isomorphic (different conjugacy class sizes or element orders).\\n");
 else
   phi := IsomorphismGroups(G, H);
   if phi = fail then
-    Print("Not isomorphic (same order ", Order(G), " but different structure).\\n");
+    Print("Not isomorphic (same order ", ordG, " but different structure).\\n");
   else
-    Print("Isomorphic! Orders: ", Order(G), "\\n");
+    Print("Isomorphic! Orders: ", ordG, "\\n");
     Print("Isomorphism found: ", phi, "\\n");
     Print("Generator images:\\n");
     for g in GeneratorsOfGroup(G) do
@@ -399,36 +583,38 @@ else
     od;
   fi;
 fi;
-"""
-    result = get_runner().execute(code, timeout=60)
-    if not result["success"]:
-        return f"GAP Error:\n{result['error']}"
-    return result["output"]
+""")
 
 
-# ─────────────────────────────────────────────
-# Tool 11: Abelian invariants
-# ─────────────────────────────────────────────
-
 @mcp.tool()
-def gap_abelian_invariants(group_expr: str) -> str:
+async def gap_isomorphism(group_expr1: str, group_expr2: str) -> str:
     """
-    Compute the abelian invariants (invariant factor decomposition) of a group.
+    Test whether two groups are isomorphic and, if so, exhibit an isomorphism.
 
-    For an abelian group G ≅ Z_{n1} × … × Z_{nk}, returns [n1, …, nk].
-    Also works for the abelianization G/[G,G] of a non-abelian group.
+    Cheap invariants (order, abelian invariants, the sizes and element
+    orders of the conjugacy classes) are compared first; the expensive
+    isomorphism search only runs when they all agree.
 
     Args:
-        group_expr: GAP group expression.
+        group_expr1: GAP expression for the first group.
+        group_expr2: GAP expression for the second group.
 
     Examples:
-        gap_abelian_invariants('CyclicGroup(12)')          -> [ 12 ] = Z_12
-        gap_abelian_invariants('AbelianGroup([2,4,3])')    -> [ 2, 4, 3 ]
-        gap_abelian_invariants('SymmetricGroup(4)')        -> [2] (abelianization = Z_2)
-        gap_abelian_invariants('AlternatingGroup(5)')      -> [] (perfect group)
+        gap_isomorphism('SymmetricGroup(3)', 'DihedralGroup(6)')  -> isomorphic
+        gap_isomorphism('CyclicGroup(4)', 'DihedralGroup(4)')     -> not isomorphic
+        gap_isomorphism('SmallGroup(8,3)', 'QuaternionGroup(8)')  -> check Q8 vs D4
     """
-    code = f"""
-G := {group_expr};
+    return await _run(
+        _ISOMORPHISM_TPL, timeout=60, group_expr1=group_expr1, group_expr2=group_expr2
+    )
+
+
+# ─────────────────────────────────────────────
+# Tool 11: Abelian invariants
+# ─────────────────────────────────────────────
+
+_ABELIAN_INVARIANTS_TPL = Template("""
+G := $group_expr;
 inv := AbelianInvariants(G);
 if Length(inv) = 0 then
   Print("Abelian invariants: [] (trivial or perfect group)\\n");
@@ -442,19 +628,48 @@ else
   Print("\\n");
 fi;
 Print("IsAbelian: ", IsAbelian(G), "\\n");
-"""
-    result = get_runner().execute(code)
-    if not result["success"]:
-        return f"GAP Error:\n{result['error']}"
-    return result["output"]
+""")
+
+
+@mcp.tool()
+async def gap_abelian_invariants(group_expr: str) -> str:
+    """
+    Compute the abelian invariants (invariant factor decomposition) of a group.
+
+    For an abelian group G ≅ Z_{n1} × … × Z_{nk}, returns [n1, …, nk].
+    Also works for the abelianization G/[G,G] of a non-abelian group.
+
+    Args:
+        group_expr: GAP group expression.
+
+    Examples:
+        gap_abelian_invariants('CyclicGroup(12)')          -> [ 12 ] = Z_12
+        gap_abelian_invariants('AbelianGroup([2,4,3])')    -> [ 2, 4, 3 ]
+        gap_abelian_invariants('SymmetricGroup(4)')        -> [2] (abelianization = Z_2)
+        gap_abelian_invariants('AlternatingGroup(5)')      -> [] (perfect group)
+    """
+    return await _run(_ABELIAN_INVARIANTS_TPL, group_expr=group_expr)
 
 
 # ─────────────────────────────────────────────
 # Tool 12: Automorphism group
 # ─────────────────────────────────────────────
 
+_AUTOMORPHISMS_TPL = Template("""
+G := $group_expr;
+A := AutomorphismGroup(G);
+ordA := Order(A);
+Print("Aut(G) order:  ", ordA, "\\n");
+inn := InnerAutomorphismsAutomorphismGroup(A);
+ordInn := Order(inn);
+Print("Inn(G) order:  ", ordInn, "\\n");
+Print("Out(G) order:  ", ordA / ordInn, "\\n");
+Print("Aut(G): ", A, "\\n");
+""")
+
+
 @mcp.tool()
-def gap_automorphisms(group_expr: str) -> str:
+async def gap_automorphisms(group_expr: str) -> str:
     """
     Compute the automorphism group Aut(G) of a group.
 
@@ -467,19 +682,7 @@ def gap_automorphisms(group_expr: str) -> str:
         gap_automorphisms('CyclicGroup(8)')    -> Aut(Z_8) ≅ Z_2 x Z_2, order 4
         gap_automorphisms('SymmetricGroup(6)') -> Aut(S6), the exceptional case
     """
-    code = f"""
-G := {group_expr};
-A := AutomorphismGroup(G);
-Print("Aut(G) order:  ", Order(A), "\\n");
-inn := InnerAutomorphismsAutomorphismGroup(A);
-Print("Inn(G) order:  ", Order(inn), "\\n");
-Print("Out(G) order:  ", Order(A) / Order(inn), "\\n");
-Print("Aut(G): ", A, "\\n");
-"""
-    result = get_runner().execute(code, timeout=60)
-    if not result["success"]:
-        return f"GAP Error:\n{result['error']}"
-    return result["output"]
+    return await _run(_AUTOMORPHISMS_TPL, timeout=60, group_expr=group_expr)
 
 
 # ─────────────────────────────────────────────
@@ -487,7 +690,7 @@ Print("Aut(G): ", A, "\\n");
 # ─────────────────────────────────────────────
 
 @mcp.tool()
-def gap_load_package(package_name: str) -> str:
+async def gap_load_package(package_name: str) -> str:
     """
     Load a GAP package (e.g. GRAPE, Hecke, cohomolo, FinInG).
 
@@ -499,18 +702,19 @@ def gap_load_package(package_name: str) -> str:
         gap_load_package('cohomolo') -> group cohomology
         gap_load_package('Hecke')    -> Hecke algebras
     """
-    code = f"""
-if LoadPackage("{package_name}") = true then
-  Print("Package {package_name} loaded successfully.\\n");
-else
-  Print("Failed to load package {package_name}.\\n");
-  Print("To list available packages, run: gap_eval('ShowPackageInformation();')\\n");
-fi;
-"""
-    result = get_runner().execute(code, timeout=30)
+    runner = await asyncio.to_thread(get_runner)
+    result = await asyncio.to_thread(runner.load_package, package_name, timeout=30)
     if not result["success"]:
-        return f"GAP Error:\n{result['error']}"
-    return result["output"]
+        return _finalize(result)
+    if result["output"] == "true":
+        # Make the package available to the specialized tools as well
+        _pool.add_package(package_name)
+        _clear_cache()
+        return f"Package {package_name} loaded successfully."
+    return (
+        f"Failed to load package {package_name}.\n"
+        "To list available packages, run: gap_eval('ShowPackageInformation();')"
+    )
 
 
 # ─────────────────────────────────────────────
@@ -518,23 +722,198 @@ fi;
 # ─────────────────────────────────────────────
 
 @mcp.tool()
-def gap_reset() -> str:
+async def gap_reset() -> str:
     """
     Reset the GAP session, clearing all variables and defined objects.
 
     Use this when the GAP state has become inconsistent or you want
-    to start a computation from a clean slate.
+    to start a computation from a clean slate. This is the session used
+    by gap_eval and gap_batch; the specialized tools always start clean.
     """
-    result = get_runner().reset()
+    _clear_cache()
+    runner = await asyncio.to_thread(get_runner)
+    result = await asyncio.to_thread(runner.reset)
     return result["output"]
 
 
+# ─────────────────────────────────────────────
+# Tool 15: Batched evaluation
+# ─────────────────────────────────────────────
+
+def _batch_marker(i: int) -> str:
+    return f"__GAPBATCH_{i}__"
+
+
+_BATCH_TRUNCATED = "(output truncated; run this query on its own with gap_eval)"
+
+
+def _split_batch(output: str, n: int) -> list[str]:
+    """
+    Cut batch output at the markers. A query whose surrounding markers were
+    lost when the output was truncated gets _BATCH_TRUNCATED instead.
+    """
+    outputs = []
+    for i in range(n):
+        start = output.find(_batch_marker(i))
+        end = output.find(_batch_marker(i + 1), start) if start != -1 else -1
+        if end == -1:
+            outputs.append(_BATCH_TRUNCATED)
+        else:
+            part = output[start + len(_batch_marker(i)):end]
+            outputs.append(part.strip() or "(no output)")
+    return outputs
+
+
+@mcp.tool()
+async def gap_batch(queries: list[str], timeout: int = 60) -> list[str]:
+    """
+    Run several independent pieces of GAP code in a single round-trip.
+
+    Much cheaper than one gap_eval call per query when asking many small
+    questions. Results are returned in the same order as the queries.
+    The queries share the gap_eval session and are never re-run. If the
+    batch raises a GAP error, each query keeps its own output and the error
+    text is attached to every result, since GAP does not say which query
+    raised it; a timeout is reported for every query. When a very long
+    output is truncated, queries whose part was cut out say so.
+
+    Args:
+        queries: GAP code strings, each as you would pass to gap_eval.
+                 Statements must end with semicolons.
+        timeout: Maximum seconds to wait for the whole batch (default 60).
+
+    Examples:
+        gap_batch(['Order(SymmetricGroup(4));', 'IsSimple(AlternatingGroup(5));'])
+            -> ['24', 'true']
+    """
+    if not queries:
+        return []
+    runner = await asyncio.to_thread(get_runner)
+    # Markers are printed on their own lines before, between and after the
+    # queries, so the combined output can be cut back into per-query parts.
+    parts = []
+    for i, query in enumerate(queries):
+        parts.append(f'Print("\\n{_batch_marker(i)}\\n");\n{query.strip()}\n')
+    parts.append(f'Print("\\n{_batch_marker(len(queries))}\\n");\n')
+    result = await asyncio.to_thread(runner.execute, "".join(parts), timeout=timeout)
+
+    output = result["output"]
+    if not result["success"] and _batch_marker(0) not in output:
+        # Timed out, blocked or GAP died: there is no output to split
+        return [_finalize(result)] * len(queries)
+    outputs = _split_batch(output, len(queries))
+    if not result["success"]:
+        # GAP continues after an error, so the markers still delimit each
+        # query's output, but the error text (on stderr) cannot be pinned to
+        # one query. Attach it to every result rather than re-running them,
+        # which would repeat their side effects.
+        error = result["error"]
+        if error.startswith(output):
+            error = error[len(output):].strip() or error
+        outputs = [f"{out}\n\nGAP Error in this batch:\n{error}" for out in outputs]
+    return outputs
+
+
+# ─────────────────────────────────────────────
+# Tool 16: Parallel tool calls
+# ─────────────────────────────────────────────
+
+# Tools gap_parallel may dispatch to: the specialized tools, which run on
+# separate pool workers and do not depend on each other's state. Each is
+# wrapped in a FastMCP Tool so its arguments go through the same validation
+# as a direct tool call.
+_PARALLEL_TOOLS = {
+    fn.__name__: Tool.from_function(fn)
+    for fn in (
+        gap_group_info, gap_elements, gap_subgroups, gap_character_table,
+        gap_sylow, gap_center, gap_derived_series, gap_conjugacy_classes,
+        gap_isomorphism, gap_abelian_invariants, gap_automorphisms,
+    )
+}
+
+
+async def _run_parallel_call(tool: Tool, args: object) -> str:
+    """Validate args against tool's argument model, then run it."""
+    try:
+        # pydantic's ValidationError is a ValueError
+        params = tool.fn_metadata.arg_model.model_validate(args)
+    except ValueError as exc:
+        return f"Error: invalid arguments for {tool.name}: {exc}"
+    try:
+        return await tool.fn(**params.model_dump_one_level())
+    except Exception as exc:
+        return f"Error: {tool.name} failed: {type(exc).__name__}: {exc}"
+
+
+@mcp.tool()
+async def gap_parallel(
+    calls: list[dict], max_concurrent: int = 4, stop_on_error: bool = False
+) -> dict:
+    """
+    Run several specialized tool calls concurrently on separate GAP workers.
+
+    Each call is {"tool": <tool name>, "args": {<argument>: <value>, ...}};
+    only the specialized tools (gap_group_info, gap_center, ...) can be
+    called. Results are returned in the same order as the calls.
+
+    Args:
+        calls:          Tool calls to run.
+        max_concurrent: Maximum number of calls running at once (default 4).
+        stop_on_error:  If True, calls that have not started yet when one
+                        fails are skipped.
+
+    Examples:
+        gap_parallel([
+            {"tool": "gap_center", "args": {"group_expr": "SymmetricGroup(4)"}},
+            {"tool": "gap_character_table", "args": {"group_expr": "SymmetricGroup(4)"}},
+        ])
+    """
+    semaphore = asyncio.Semaphore(max(1, max_concurrent))
+    failed = asyncio.Event()
+
+    async def run(call: dict) -> dict:
+        name = call.get("tool")
+        async with semaphore:
+            if stop_on_error and failed.is_set():
+                return {"tool": name, "status": "skipped", "result": None}
+            # A missing or non-string tool is reported like an unknown one
+            tool = _PARALLEL_TOOLS.get(name) if isinstance(name, str) else None
+            if tool is None:
+                output = f"Error: unknown tool {name!r}."
+            else:
+                output = await _run_parallel_call(tool, call.get("args", {}))
+        ok = tool is not None and not output.startswith(("GAP Error:", "Error:"))
+        if not ok:
+            failed.set()
+        return {"tool": name, "status": "success" if ok else "error", "result": output}
+
+    results = await asyncio.gather(*(run(call) for call in calls))
+    statuses = [r["status"] for r in results]
+    return {
+        "results": results,
+        "summary": {
+            "total": len(results),
+            "succeeded": statuses.count("success"),
+            "failed": statuses.count("error"),
+            "skipped": statuses.count("skipped"),
+        },
+    }
+
+
 # ─────────────────────────────────────────────
 # Entry point
 # ─────────────────────────────────────────────
 
+def _warm_up_runner() -> None:
+    try:
+        get_runner()
+        _pool.prestart()
+    except Exception:
+        # Tool calls will retry and report the problem to the client
+        logger.warning("Could not start GAP at server startup.", exc_info=True)
+
+
 def main() -> None:
-    import argparse
     logging.basicConfig(level=logging.WARNING)
 
     parser = argparse.ArgumentParser(description="GAP MCP Server")
@@ -543,12 +922,28 @@ def main() -> None:
         type=str,
         help="Path to GAP executable (auto-detected if not provided)",
     )
+    parser.add_argument(
+        "--pool-size",
+        type=_pool_size,
+        default=os.environ.get("GAP_MCP_POOL_SIZE", "4"),
+        help="Number of GAP workers for the specialized tools "
+        "(default: $GAP_MCP_POOL_SIZE or 4)",
+    )
     args = parser.parse_args()
 
     if args.gap_executable:
         os.environ["GAP_EXECUTABLE"] = args.gap_executable
-
-    mcp.run()
+    _pool.max_size = args.pool_size
+
+    # Start GAP in the background so the first tool call does not pay for
+    # its startup; get_runner() makes early callers wait until it is ready,
+    # and the first pool worker started here is handed to the first caller.
+    threading.Thread(target=_warm_up_runner, daemon=True).start()
+    try:
+        mcp.run()
+    finally:
+        # Stop the pool workers now rather than leaving them to notice EOF
+        _pool.close()
 
 
 if __name__ == "__main__":
@@ -1,13 +1,26 @@
 """Unit and integration tests for gap_runner.py"""
 
+import os
+import selectors
+import threading
+
 import pytest
-from unittest.mock import patch
-from gap_mcp.gap_runner import find_gap_executable, _contains_blocked, GAPRunner
+from unittest.mock import MagicMock, patch
+from gap_mcp.gap_runner import (
+    find_gap_executable, _contains_blocked, _gap_str, _resolve_executable,
+    GAPRunner, _GAPProcess, MAX_OUTPUT_BYTES, SENTINEL, _WARMUP_CODE,
+)
 
 
 # ─── Unit tests (no GAP required) ────────────────────────────────────────────
 
 class TestFindGapExecutable:
+    @pytest.fixture(autouse=True)
+    def clear_cache(self):
+        find_gap_executable.cache_clear()
+        yield
+        find_gap_executable.cache_clear()
+
     def test_raises_when_not_found(self):
         with patch("shutil.which", return_value=None), \
              patch("os.path.isfile", return_value=False):
@@ -20,6 +33,12 @@ class TestFindGapExecutable:
             result = find_gap_executable()
             assert result == "/usr/bin/gap"
 
+    def test_result_is_cached(self):
+        with patch("shutil.which", return_value="/usr/bin/gap") as which:
+            find_gap_executable()
+            find_gap_executable()
+            assert which.call_count == 1
+
     def test_env_var_takes_precedence(self, monkeypatch):
         monkeypatch.setenv("GAP_EXECUTABLE", "/custom/gap")
         runner = GAPRunner.__new__(GAPRunner)
@@ -30,6 +49,21 @@ class TestFindGapExecutable:
         assert runner.gap_executable == "/custom/gap"
 
 
+class TestResolveExecutable:
+    def test_bare_name_is_looked_up_on_path(self):
+        with patch("gap_mcp.gap_runner.shutil.which", return_value="/usr/bin/gap"):
+            assert _resolve_executable("gap") == "/usr/bin/gap"
+
+    def test_path_is_kept(self):
+        with patch("gap_mcp.gap_runner.shutil.which") as which:
+            assert _resolve_executable("./bin/gap") == "./bin/gap"
+        which.assert_not_called()
+
+    def test_unknown_name_is_kept(self):
+        with patch("gap_mcp.gap_runner.shutil.which", return_value=None):
+            assert _resolve_executable("gap") == "gap"
+
+
 class TestContainsBlocked:
     def test_blocks_quit(self):
         assert _contains_blocked("Order(G); QUIT;") == "QUIT"
@@ -37,6 +71,9 @@ class TestContainsBlocked:
     def test_blocks_exec(self):
         assert _contains_blocked("Exec('rm -rf /')") == "Exec("
 
+    def test_reports_earliest_match(self):
+        assert _contains_blocked("Exec('ls'); QUIT;") == "Exec("
+
     def test_allows_normal_code(self):
         assert _contains_blocked("Order(SymmetricGroup(4));") is None
 
@@ -45,6 +82,246 @@ class TestContainsBlocked:
         assert _contains_blocked(code) is None
 
 
+class TestGapStr:
+    def test_plain_name(self):
+        assert _gap_str("GRAPE") == '"GRAPE"'
+
+    def test_escapes_quotes_and_backslashes(self):
+        assert _gap_str('a"b\\c') == '"a\\"b\\\\c"'
+
+    def test_escapes_newlines(self):
+        assert _gap_str("a\nb") == '"a\\nb"'
+
+
+class TestShortCircuits:
+    """Calls answered without a GAP process (the runner is never started)."""
+
+    def test_empty_code(self):
+        runner = GAPRunner.__new__(GAPRunner)
+        result = runner.execute("  \n ")
+        assert result == {"success": True, "output": "", "error": None}
+
+    def test_package_already_loaded(self):
+        runner = GAPRunner.__new__(GAPRunner)
+        runner._loaded_packages = {"GRAPE"}
+        assert runner.load_package("GRAPE")["output"] == "true"
+
+
+class TestWarmup:
+    """_spawn() with a mock process in place of GAP."""
+
+    def spawn(self, warmup):
+        runner = GAPRunner.__new__(GAPRunner)
+        runner.gap_executable = "/usr/bin/gap"
+        runner.warmup = warmup
+        with patch("gap_mcp.gap_runner._GAPProcess") as process_class:
+            runner._spawn()
+        return process_class.return_value
+
+    def test_new_process_is_warmed_up(self):
+        proc = self.spawn(warmup=True)
+        assert proc.send_sentinel.call_count == 2
+        assert proc.send_sentinel.call_args.kwargs["code"] == _WARMUP_CODE
+        proc.drain_stderr.assert_called_once()
+
+    def test_warmup_can_be_disabled(self):
+        proc = self.spawn(warmup=False)
+        proc.send_sentinel.assert_called_once_with(timeout=30)
+
+
+class TestFailedCommand:
+    """execute() with a mock process whose command never completes."""
+
+    def run(self, exc):
+        runner = GAPRunner.__new__(GAPRunner)
+        runner.default_timeout = 60
+        runner._lock = threading.Lock()
+        runner._process = proc = MagicMock()
+        proc.send_sentinel.side_effect = exc
+        with patch.object(GAPRunner, "_start") as start:
+            result = runner.execute("Order(SymmetricGroup(12));")
+        return result, proc, start
+
+    def test_timeout_kills_and_restarts(self):
+        result, proc, start = self.run(TimeoutError("too slow"))
+        assert result == {"success": False, "output": "", "error": "too slow"}
+        proc.kill.assert_called_once()
+        proc.close.assert_not_called()
+        start.assert_called_once()
+
+    def test_dead_process_is_killed(self):
+        result, proc, start = self.run(RuntimeError("gone"))
+        assert result["error"] == "gone"
+        proc.kill.assert_called_once()
+        proc.close.assert_not_called()
+
+    def test_kill_closes_pipes(self):
+        proc = _GAPProcess.__new__(_GAPProcess)
+        proc.popen = MagicMock()
+        proc.selector = MagicMock()
+        proc.stderr_file = MagicMock()
+        proc.kill()
+        proc.popen.stdin.close.assert_called_once()
+        proc.popen.stdout.close.assert_called_once()
+        proc.stderr_file.close.assert_called_once()
+
+
+class TestOutputLimit:
+    """The max_bytes passed on to send_sentinel(), with a mock process."""
+
+    def run(self, **kwargs):
+        runner = GAPRunner.__new__(GAPRunner)
+        runner.default_timeout = 60
+        runner._lock = threading.Lock()
+        runner._process = MagicMock()
+        runner._process.send_sentinel.return_value = "24\n"
+        runner._process.drain_stderr.return_value = ""
+        assert runner.execute("Order(G);", **kwargs)["output"] == "24"
+        return runner._process.send_sentinel.call_args.kwargs["max_bytes"]
+
+    def test_output_is_bounded_by_default(self):
+        assert self.run() == MAX_OUTPUT_BYTES
+
+    def test_limit_can_be_lifted(self):
+        assert self.run(max_bytes=None) is None
+
+
+class TestStandby:
+    """Promoting the warm standby, with mock processes in place of GAP."""
+
+    @pytest.fixture
+    def runner(self):
+        runner = GAPRunner.__new__(GAPRunner)
+        runner.use_standby = True
+        runner._process = MagicMock()
+        runner._standby = MagicMock()
+        runner._standby_thread = None
+        runner._standby_lock = threading.Lock()
+        runner._lock = threading.Lock()
+        with patch.object(GAPRunner, "_spawn") as spawn, \
+                patch.object(GAPRunner, "_start_prewarm") as prewarm:
+            runner.spawn, runner.prewarm = spawn, prewarm
+            yield runner
+
+    def test_ready_standby_is_promoted(self, runner):
+        standby = runner._standby
+        assert runner._swap_standby() is True
+        assert runner._process is standby
+        assert runner._standby is None
+        runner.prewarm.assert_called_once()
+
+    def test_reset_promotes_standby(self, runner):
+        old, standby = runner._process, runner._standby
+        runner.reset()
+        old.close.assert_called_once()
+        assert runner._process is standby
+        runner.spawn.assert_not_called()
+
+    def test_dead_standby_falls_back_to_spawn(self, runner):
+        standby = runner._standby
+        standby.alive.return_value = False
+        runner._start()
+        standby.close.assert_called_once()
+        assert runner._process is runner.spawn.return_value
+        runner.prewarm.assert_called_once()
+
+    def test_no_standby_is_started_when_disabled(self):
+        runner = GAPRunner.__new__(GAPRunner)
+        runner.use_standby = False
+        runner._standby = None
+        runner._standby_thread = None
+        runner._standby_lock = threading.Lock()
+        with patch.object(GAPRunner, "_spawn") as spawn:
+            runner._start()
+        spawn.assert_called_once()
+        assert runner._standby_thread is None
+
+
+class TestSendSentinel:
+    """send_sentinel() against a pipe fed by a thread instead of GAP."""
+
+    @pytest.fixture
+    def fake_process(self):
+        procs = []
+
+        def make(data: bytes) -> _GAPProcess:
+            proc = _GAPProcess.__new__(_GAPProcess)
+            r, w = os.pipe()
+            proc.stdin_fd = os.open(os.devnull, os.O_WRONLY)
+            proc.stdout_fd = r
+            proc.stdout_buf = bytearray()
+            proc.sentinel_cmd = b""
+            proc.sentinel_mark = f"{SENTINEL}0123\n".encode()
+            os.set_blocking(r, False)
+            proc.selector = selectors.DefaultSelector()
+            proc.selector.register(r, selectors.EVENT_READ)
+
+            def feed():
+                with open(w, "wb") as f:
+                    f.write(data + proc.sentinel_mark)
+
+            threading.Thread(target=feed, daemon=True).start()
+            procs.append(proc)
+            return proc
+
+        yield make
+        for proc in procs:
+            proc.selector.close()
+            os.close(proc.stdout_fd)
+            os.close(proc.stdin_fd)
+
+    def test_short_output_is_untouched(self, fake_process):
+        proc = fake_process(b"hello\n")
+        assert proc.send_sentinel(5, max_bytes=1000) == "hello\n"
+
+    def test_bare_sentinel_prefix_does_not_end_output(self, fake_process):
+        proc = fake_process(f"a\n{SENTINEL}\nb\n".encode())
+        assert proc.send_sentinel(5) == f"a\n{SENTINEL}\nb\n"
+
+    def test_long_output_keeps_head_and_tail(self, fake_process):
+        data = b"H" * 500 + b"x" * 1_000_000 + b"T" * 500
+        proc = fake_process(data)
+        output = proc.send_sentinel(5, max_bytes=1000)
+        assert output.startswith("H" * 500 + "\n")
+        assert output.endswith("\n" + "T" * 500)
+        assert f"[truncated {len(data) - 1000} bytes]" in output
+
+    def test_large_input_with_large_output(self):
+        # A fake GAP that answers every input line with 100 bytes, and only
+        # reads its next line once the answer is written
+        in_r, in_w = os.pipe()
+        out_r, out_w = os.pipe()
+        proc = _GAPProcess.__new__(_GAPProcess)
+        proc.stdin_fd = in_w
+        proc.stdout_fd = out_r
+        proc.stdout_buf = bytearray()
+        proc.sentinel_cmd = b"sentinel;\n"
+        proc.sentinel_mark = f"{SENTINEL}0123\n".encode()
+        os.set_blocking(in_w, False)
+        os.set_blocking(out_r, False)
+        proc.selector = selectors.DefaultSelector()
+        proc.selector.register(out_r, selectors.EVENT_READ)
+
+        def fake_gap():
+            with open(in_r, "rb") as stdin, open(out_w, "wb") as stdout:
+                for line in stdin:
+                    if line == proc.sentinel_cmd:
+                        stdout.write(proc.sentinel_mark)
+                        return
+                    stdout.write(b"y" * 99 + b"\n")
+
+        threading.Thread(target=fake_gap, daemon=True).start()
+        code = b"x := 1234567890;\n" * 20_000
+        try:
+            output = proc.send_sentinel(10, max_bytes=1000, code=code)
+        finally:
+            proc.selector.close()
+            os.close(in_w)
+            os.close(out_r)
+        assert output.startswith("y" * 99 + "\n")
+        assert f"[truncated {20_000 * 100 - 1000} bytes]" in output
+
+
 # ─── Integration tests (require GAP) ─────────────────────────────────────────
 
 @pytest.mark.integration
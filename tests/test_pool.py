@@ -0,0 +1,83 @@
+"""Unit tests for pool.py (no GAP required)."""
+
+import asyncio
+
+import pytest
+from unittest.mock import MagicMock, patch
+from gap_mcp.pool import GAPPool
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture
+def fake_runner_class():
+    """Patch GAPRunner so that every instance is a fresh mock."""
+    with patch("gap_mcp.pool.GAPRunner", side_effect=lambda *a, **kw: MagicMock()) as cls:
+        yield cls
+
+
+class TestGAPPool:
+    async def test_runners_start_lazily(self, fake_runner_class):
+        pool = GAPPool(max_size=2)
+        assert fake_runner_class.call_count == 0
+        async with pool.acquire():
+            pass
+        assert fake_runner_class.call_count == 1
+
+    async def test_released_runner_is_reused(self, fake_runner_class):
+        pool = GAPPool(max_size=2)
+        async with pool.acquire() as first:
+            pass
+        async with pool.acquire() as second:
+            pass
+        assert first is second
+        assert fake_runner_class.call_count == 1
+
+    async def test_concurrent_callers_get_separate_runners(self, fake_runner_class):
+        pool = GAPPool(max_size=2)
+        async with pool.acquire() as first, pool.acquire() as second:
+            assert first is not second
+
+    async def test_waits_when_pool_is_exhausted(self, fake_runner_class):
+        pool = GAPPool(max_size=1)
+        async with pool.acquire() as first:
+            waiter = asyncio.create_task(pool.acquire().__aenter__())
+            await asyncio.sleep(0)
+            assert not waiter.done()
+        assert await waiter is first
+        assert fake_runner_class.call_count == 1
+
+    async def test_scratch_vars_are_unbound_on_release(self, fake_runner_class):
+        pool = GAPPool(scratch_vars=["G", "H"])
+        async with pool.acquire() as runner:
+            runner.execute.assert_not_called()
+        code = runner.execute.call_args.args[0]
+        assert '"G", "H"' in code
+        assert "UnbindGlobal" in code
+
+    async def test_registered_packages_are_loaded(self, fake_runner_class):
+        pool = GAPPool()
+        pool.add_package("GRAPE")
+        async with pool.acquire() as runner:
+            runner.load_package.assert_called_once_with("GRAPE")
+
+    async def test_failed_start_frees_its_slot(self, fake_runner_class):
+        pool = GAPPool(max_size=1)
+        fake_runner_class.side_effect = [FileNotFoundError("no gap"), MagicMock()]
+        with pytest.raises(FileNotFoundError):
+            async with pool.acquire():
+                pass
+        async with pool.acquire():
+            pass
+
+    async def test_prestarted_runner_is_handed_out(self, fake_runner_class):
+        pool = GAPPool(max_size=1)
+        pool.prestart()
+        async with pool.acquire():
+            pass
+        assert fake_runner_class.call_count == 1
+        fake_runner_class.assert_called_with(None, standby=False)
+
+    async def test_size_below_one_is_rejected(self):
+        with pytest.raises(ValueError):
+            GAPPool(max_size=0)
@@ -1,94 +1,399 @@
-"""Integration tests for server.py MCP tools."""
+"""Unit and integration tests for server.py MCP tools."""
+
+import argparse
+import contextlib
 
 import pytest
+from unittest.mock import MagicMock, patch
+from gap_mcp import server
 from gap_mcp.server import (
     gap_eval, gap_group_info, gap_elements, gap_subgroups,
     gap_sylow, gap_center, gap_derived_series, gap_conjugacy_classes,
-    gap_isomorphism, gap_abelian_invariants, gap_automorphisms,
+    gap_isomorphism, gap_abelian_invariants, gap_automorphisms, gap_reset,
+    gap_batch, gap_load_package, gap_parallel,
 )
 
+pytestmark = pytest.mark.asyncio
+
+
+# ─── Unit tests (no GAP required) ────────────────────────────────────────────
+
+class FakePool:
+    """Stand-in for GAPPool that always lends out the same runner."""
+
+    def __init__(self, runner):
+        self.runner = runner
+
+    @contextlib.asynccontextmanager
+    async def acquire(self):
+        yield self.runner
+
+    def add_package(self, name):
+        pass
+
+
+@pytest.fixture
+def fake_runner():
+    """Patch get_runner() and the pool with a mock whose execute() always succeeds."""
+    runner = MagicMock()
+    runner.execute.return_value = {"success": True, "output": "ok", "error": None}
+    runner.reset.return_value = {"success": True, "output": "reset", "error": None}
+    server._clear_cache()
+    with patch("gap_mcp.server.get_runner", return_value=runner), \
+            patch("gap_mcp.server._pool", FakePool(runner)):
+        yield runner
+    server._clear_cache()
+
+
+class TestResultCache:
+    async def test_repeated_query_hits_cache(self, fake_runner):
+        assert await gap_group_info("SymmetricGroup(4)") == "ok"
+        assert await gap_group_info("SymmetricGroup(4)") == "ok"
+        assert fake_runner.execute.call_count == 1
+
+    async def test_different_arguments_miss(self, fake_runner):
+        await gap_elements("CyclicGroup(4)")
+        await gap_elements("CyclicGroup(4)", max_order=2)
+        assert fake_runner.execute.call_count == 2
+
+    async def test_errors_are_not_cached(self, fake_runner):
+        fake_runner.execute.return_value = {
+            "success": False, "output": "", "error": "Error, boom",
+        }
+        await gap_center("Foo")
+        await gap_center("Foo")
+        assert fake_runner.execute.call_count == 2
+
+    async def test_reset_clears_cache(self, fake_runner):
+        await gap_center("CyclicGroup(4)")
+        await gap_reset()
+        await gap_center("CyclicGroup(4)")
+        assert fake_runner.execute.call_count == 2
+
+    async def test_loading_a_package_clears_cache(self, fake_runner):
+        fake_runner.load_package.return_value = {"success": True, "output": "true", "error": None}
+        await gap_center("CyclicGroup(4)")
+        await gap_load_package("GRAPE")
+        await gap_center("CyclicGroup(4)")
+        assert fake_runner.execute.call_count == 2
+
+    async def test_eval_keeps_cache(self, fake_runner):
+        # Pool workers never see session variables, so gap_eval cannot
+        # change what a cached group expression means
+        await gap_center("CyclicGroup(4)")
+        await gap_eval("x := 1;")
+        await gap_center("CyclicGroup(4)")
+        # one gap_center miss plus the gap_eval call itself
+        assert fake_runner.execute.call_count == 2
+
+
+class TestGroupExprPreflight:
+    @pytest.mark.parametrize("expr", [
+        "", "  ", "SymmetricGroup(4", "CyclicGroup(4))", "Group([(1,2)]",
+        "CyclicGroup(4) # comment", 'Group("(1,2)',
+    ])
+    async def test_malformed_expressions_fail_fast(self, fake_runner, expr):
+        result = await gap_center(expr)
+        assert result.startswith("GAP Error:\nInvalid group_expr")
+        fake_runner.execute.assert_not_called()
+
+    @pytest.mark.parametrize("expr", [
+        "SymmetricGroup(4)", "SmallGroup(8,3)", "Group((1,2,3),(1,2))",
+        "AbelianGroup([2,4,3])", 'AsGroup(List(["a;#)"], x -> ()))',
+        "Group(List([1..3], function(i) return (1,2,3)^i; end))",
+        "Subgroup(S, Filtered(Elements(S), function(g) return g^2 = (); end))",
+    ])
+    async def test_other_expressions_reach_gap(self, fake_runner, expr):
+        assert await gap_center(expr) == "ok"
+        fake_runner.execute.assert_called_once()
+
+    async def test_second_group_of_isomorphism_is_checked(self, fake_runner):
+        result = await gap_isomorphism("CyclicGroup(4)", "CyclicGroup(4")
+        assert "Invalid group_expr2" in result
+        fake_runner.execute.assert_not_called()
+
+
+class TestElementsCap:
+    async def test_max_order_is_capped(self, fake_runner):
+        await gap_elements("SymmetricGroup(8)", max_order=10**6)
+        code = fake_runner.execute.call_args.args[0]
+        assert f"ord <= {server._MAX_LISTED_ELEMENTS} then" in code
+
+
+class TestGroupInfoScript:
+    async def test_abelian_groups_skip_class_enumeration(self, fake_runner):
+        await gap_group_info("CyclicGroup(10^6)")
+        code = fake_runner.execute.call_args.args[0]
+        abelian, other = code.split("\nelse\n")
+        assert "Exponent(G)" in abelian
+        assert "ConjugacyClasses(G)" not in abelian
+        assert "cls := ConjugacyClasses(G);" in other
+
+    async def test_basic_properties_do_not_wait_for_classes(self, fake_runner):
+        await gap_group_info("SymmetricGroup(4)")
+        code = fake_runner.execute.call_args.args[0]
+        assert code.index('"IsNilpotent: "') < code.index("ConjugacyClasses(G)")
+
+
+class TestIsomorphismScript:
+    async def test_class_profile_is_skipped_for_abelian_groups(self, fake_runner):
+        await gap_isomorphism("CyclicGroup(10^6)", "AbelianGroup([10^6])")
+        code = fake_runner.execute.call_args.args[0]
+        assert code.index("not IsAbelian(G)") < code.index("ConjugacyClasses(G)")
+
+
+class TestPoolRouting:
+    async def test_specialized_tools_use_pool(self, fake_runner):
+        pool_runner = MagicMock()
+        pool_runner.execute.return_value = {"success": True, "output": "24", "error": None}
+        with patch("gap_mcp.server._pool", FakePool(pool_runner)):
+            assert await gap_group_info("SymmetricGroup(4)") == "24"
+        assert pool_runner.execute.call_count == 1
+        fake_runner.execute.assert_not_called()
+
+    async def test_loaded_package_is_registered_with_pool(self, fake_runner):
+        fake_runner.load_package.return_value = {"success": True, "output": "true", "error": None}
+        pool = FakePool(fake_runner)
+        pool.add_package = MagicMock()
+        with patch("gap_mcp.server._pool", pool):
+            result = await gap_load_package("GRAPE")
+        assert "loaded successfully" in result
+        pool.add_package.assert_called_once_with("GRAPE")
+
+
+class TestPoolSize:
+    async def test_valid_size(self):
+        assert server._pool_size("2") == 2
+
+    @pytest.mark.parametrize("value", ["0", "-1", "four", ""])
+    async def test_invalid_size_is_rejected(self, value):
+        with pytest.raises(argparse.ArgumentTypeError):
+            server._pool_size(value)
+
+    async def test_invalid_environment_value_exits(self, monkeypatch):
+        monkeypatch.setenv("GAP_MCP_POOL_SIZE", "0")
+        monkeypatch.setattr("sys.argv", ["gap-mcp"])
+        with pytest.raises(SystemExit):
+            server.main()
+
+    async def test_pool_is_closed_on_shutdown(self, monkeypatch):
+        monkeypatch.setattr("sys.argv", ["gap-mcp", "--pool-size", "2"])
+        pool = MagicMock()
+        with patch.object(server, "_pool", pool), patch.object(server.mcp, "run"), \
+                patch.object(server.threading, "Thread"):
+            server.main()
+        assert pool.max_size == 2
+        pool.close.assert_called_once()
+
+
+class TestGapBatch:
+    async def test_splits_output_per_query(self, fake_runner):
+        m = server._batch_marker
+        fake_runner.execute.return_value = {
+            "success": True,
+            "output": f"{m(0)}\n24\n{m(1)}\n\n{m(2)}",
+            "error": None,
+        }
+        assert await gap_batch(["Order(G);", "x := 1;;"]) == ["24", "(no output)"]
+        assert fake_runner.execute.call_count == 1
+
+    async def test_error_keeps_per_query_output(self, fake_runner):
+        m = server._batch_marker
+        output = f"{m(0)}\n24\n{m(1)}\n{m(2)}"
+        fake_runner.execute.return_value = {
+            "success": False, "output": output, "error": f"{output}\nError, boom",
+        }
+        assert await gap_batch(["Order(G);", "Foo();"]) == [
+            "24\n\nGAP Error in this batch:\nError, boom",
+            "(no output)\n\nGAP Error in this batch:\nError, boom",
+        ]
+        assert fake_runner.execute.call_count == 1
+
+    async def test_truncated_queries_are_flagged(self, fake_runner):
+        m = server._batch_marker
+        fake_runner.execute.return_value = {
+            "success": True,
+            "output": f"{m(0)}\n1\n{m(1)}\nxx\n... [truncated 9 bytes] ...\nyy\n{m(3)}\n4\n{m(4)}",
+            "error": None,
+        }
+        result = await gap_batch(["1;", "2;", "3;", "4;"])
+        assert result == ["1", server._BATCH_TRUNCATED, server._BATCH_TRUNCATED, "4"]
+        assert fake_runner.execute.call_count == 1
+
+    async def test_timeout_is_reported_for_every_query(self, fake_runner):
+        fake_runner.execute.return_value = {
+            "success": False, "output": "", "error": "GAP did not respond",
+        }
+        assert await gap_batch(["1;", "2;"]) == ["GAP Error:\nGAP did not respond"] * 2
+        assert fake_runner.execute.call_count == 1
+
+
+class TestGapParallel:
+    async def test_results_keep_call_order(self, fake_runner):
+        fake_runner.execute.side_effect = lambda code, timeout=None: {
+            "success": True, "output": code.split(";")[0].strip(), "error": None,
+        }
+        result = await gap_parallel([
+            {"tool": "gap_center", "args": {"group_expr": "CyclicGroup(4)"}},
+            {"tool": "gap_group_info", "args": {"group_expr": "SymmetricGroup(3)"}},
+        ])
+        assert [r["result"] for r in result["results"]] == [
+            "G := CyclicGroup(4)", "G := SymmetricGroup(3)",
+        ]
+        assert result["summary"] == {"total": 2, "succeeded": 2, "failed": 0, "skipped": 0}
+
+    async def test_bad_calls_are_reported(self, fake_runner):
+        result = await gap_parallel([
+            {"tool": "gap_eval", "args": {"code": "1;"}},
+            {"tool": "gap_center", "args": {"group": "CyclicGroup(4)"}},
+            {"args": {"group_expr": "CyclicGroup(4)"}},
+            {"tool": ["gap_center"]},
+        ])
+        assert [r["status"] for r in result["results"]] == ["error"] * 4
+        assert "unknown tool" in result["results"][0]["result"]
+        assert "invalid arguments" in result["results"][1]["result"]
+        assert "unknown tool None" in result["results"][2]["result"]
+        assert "unknown tool ['gap_center']" in result["results"][3]["result"]
+        fake_runner.execute.assert_not_called()
+
+    async def test_argument_types_are_validated(self, fake_runner):
+        result = await gap_parallel([
+            {"tool": "gap_center", "args": {"group_expr": 5}},
+            {"tool": "gap_sylow", "args": {"group_expr": "SymmetricGroup(4)",
+                                           "prime": '2"); Print("x'}},
+            {"tool": "gap_center", "args": ["SymmetricGroup(4)"]},
+        ])
+        assert [r["status"] for r in result["results"]] == ["error"] * 3
+        assert all("invalid arguments" in r["result"] for r in result["results"])
+        fake_runner.execute.assert_not_called()
+
+    async def test_numeric_strings_are_coerced(self, fake_runner):
+        fake_runner.execute.return_value = {"success": True, "output": "ok", "error": None}
+        result = await gap_parallel([
+            {"tool": "gap_sylow", "args": {"group_expr": "SymmetricGroup(4)", "prime": "2"}},
+        ])
+        assert result["results"][0]["status"] == "success"
+        assert "p := 2;" in fake_runner.execute.call_args.args[0]
+
+    async def test_exception_fails_only_its_call(self, fake_runner):
+        fake_runner.execute.side_effect = [
+            {"success": True, "output": "ok", "error": None},
+            OSError("pipe closed"),
+        ]
+        result = await gap_parallel([
+            {"tool": "gap_center", "args": {"group_expr": "CyclicGroup(4)"}},
+            {"tool": "gap_center", "args": {"group_expr": "CyclicGroup(5)"}},
+        ], max_concurrent=1)
+        assert [r["status"] for r in result["results"]] == ["success", "error"]
+        assert "OSError: pipe closed" in result["results"][1]["result"]
+
+    async def test_stop_on_error_skips_remaining_calls(self, fake_runner):
+        fake_runner.execute.return_value = {
+            "success": False, "output": "", "error": "Error, boom",
+        }
+        calls = [{"tool": "gap_center", "args": {"group_expr": f"Foo({i})"}} for i in range(3)]
+        result = await gap_parallel(calls, max_concurrent=1, stop_on_error=True)
+        assert [r["status"] for r in result["results"]] == ["error", "skipped", "skipped"]
+        assert fake_runner.execute.call_count == 1
+
+
+# ─── Integration tests (require GAP) ─────────────────────────────────────────
+
 
 @pytest.mark.integration
 class TestServerTools:
 
-    def test_gap_eval_arithmetic(self, gap_available):
-        result = gap_eval("Factorial(5);")
+    async def test_gap_eval_arithmetic(self, gap_available):
+        result = await gap_eval("Factorial(5);")
         assert "120" in result
 
-    def test_gap_eval_multiline(self, gap_available):
+    async def test_gap_eval_multiline(self, gap_available):
         code = "total := 0;\nfor i in [1..4] do total := total + i; od;\nPrint(total, \"\\n\");"
-        result = gap_eval(code)
+        result = await gap_eval(code)
         assert "10" in result
 
-    def test_gap_group_info_s4(self, gap_available):
-        result = gap_group_info("SymmetricGroup(4)")
+    async def test_gap_group_info_s4(self, gap_available):
+        result = await gap_group_info("SymmetricGroup(4)")
         assert "Order: 24" in result
         assert "IsAbelian: false" in result
         assert "IsSolvable: true" in result
         assert "IsSimple: false" in result
 
-    def test_gap_group_info_a5(self, gap_available):
-        result = gap_group_info("AlternatingGroup(5)")
+    async def test_gap_group_info_a5(self, gap_available):
+        result = await gap_group_info("AlternatingGroup(5)")
         assert "Order: 60" in result
         assert "IsSimple: true" in result
         assert "IsSolvable: false" in result
 
-    def test_gap_elements_small(self, gap_available):
-        result = gap_elements("CyclicGroup(4)")
+    async def test_gap_elements_small(self, gap_available):
+        result = await gap_elements("CyclicGroup(4)")
         assert "order" in result
 
-    def test_gap_elements_large_shows_generators(self, gap_available):
-        result = gap_elements("SymmetricGroup(5)", max_order=10)
+    async def test_gap_elements_large_shows_generators(self, gap_available):
+        result = await gap_elements("SymmetricGroup(5)", max_order=10)
         assert "too large" in result or "Generators" in result
 
-    def test_gap_subgroups_normal(self, gap_available):
-        result = gap_subgroups("SymmetricGroup(3)", normal_only=True)
+    async def test_gap_subgroups_normal(self, gap_available):
+        result = await gap_subgroups("SymmetricGroup(3)", normal_only=True)
         assert "Normal subgroups" in result
         assert "Total:" in result
 
-    def test_gap_sylow_s4_p2(self, gap_available):
-        result = gap_sylow("SymmetricGroup(4)", 2)
+    async def test_gap_subgroups_by_class_s3(self, gap_available):
+        result = await gap_subgroups("SymmetricGroup(3)")
+        assert "Total: 6 subgroups in 4 conjugacy classes" in result
+        assert "Order 2, class size 3:" in result
+
+    async def test_gap_sylow_s4_p2(self, gap_available):
+        result = await gap_sylow("SymmetricGroup(4)", 2)
         assert "8" in result   # Sylow 2-subgroup of S4 has order 8
         assert "3" in result   # there are 3 Sylow 2-subgroups
 
-    def test_gap_sylow_not_prime(self, gap_available):
-        result = gap_sylow("SymmetricGroup(4)", 4)
+    async def test_gap_sylow_not_prime(self, gap_available):
+        result = await gap_sylow("SymmetricGroup(4)", 4)
         assert "not prime" in result
 
-    def test_gap_center_s4_trivial(self, gap_available):
-        result = gap_center("SymmetricGroup(4)")
+    async def test_gap_center_s4_trivial(self, gap_available):
+        result = await gap_center("SymmetricGroup(4)")
         assert "order: 1" in result
         assert "false" in result   # G/Z(G) is not cyclic
 
-    def test_gap_derived_series_a5_simple(self, gap_available):
-        result = gap_derived_series("AlternatingGroup(5)")
+    async def test_gap_derived_series_a5_simple(self, gap_available):
+        result = await gap_derived_series("AlternatingGroup(5)")
         assert "IsSolvable: false" in result
 
-    def test_gap_conjugacy_classes_s4(self, gap_available):
-        result = gap_conjugacy_classes("SymmetricGroup(4)")
+    async def test_gap_conjugacy_classes_s4(self, gap_available):
+        result = await gap_conjugacy_classes("SymmetricGroup(4)")
         assert "Total: 5 classes" in result
 
-    def test_gap_isomorphism_s3_d6(self, gap_available):
-        result = gap_isomorphism("SymmetricGroup(3)", "DihedralGroup(6)")
+    async def test_gap_isomorphism_s3_d6(self, gap_available):
+        result = await gap_isomorphism("SymmetricGroup(3)", "DihedralGroup(6)")
         assert "Isomorphic" in result
 
-    def test_gap_isomorphism_different_orders(self, gap_available):
-        result = gap_isomorphism("CyclicGroup(4)", "CyclicGroup(6)")
+    async def test_gap_isomorphism_different_orders(self, gap_available):
+        result = await gap_isomorphism("CyclicGroup(4)", "CyclicGroup(6)")
         assert "Not isomorphic" in result
 
-    def test_gap_abelian_invariants_cyclic(self, gap_available):
-        result = gap_abelian_invariants("CyclicGroup(12)")
+    async def test_gap_isomorphism_same_order_invariants_differ(self, gap_available):
+        result = await gap_isomorphism("CyclicGroup(8)", "QuaternionGroup(8)")
+        assert "Not isomorphic (different abelian invariants" in result
+
+    async def test_gap_abelian_invariants_cyclic(self, gap_available):
+        result = await gap_abelian_invariants("CyclicGroup(12)")
         assert "12" in result
 
-    def test_gap_abelian_invariants_s4(self, gap_available):
-        result = gap_abelian_invariants("SymmetricGroup(4)")
+    async def test_gap_abelian_invariants_s4(self, gap_available):
+        result = await gap_abelian_invariants("SymmetricGroup(4)")
         # Abelianization of S4 is Z_2
         assert "2" in result
 
-    def test_gap_abelian_invariants_a5_perfect(self, gap_available):
-        result = gap_abelian_invariants("AlternatingGroup(5)")
+    async def test_gap_abelian_invariants_a5_perfect(self, gap_available):
+        result = await gap_abelian_invariants("AlternatingGroup(5)")
         assert "trivial or perfect" in result
 
-    def test_gap_automorphisms_cyclic8(self, gap_available):
-        result = gap_automorphisms("CyclicGroup(8)")
+    async def test_gap_automorphisms_cyclic8(self, gap_available):
+        result = await gap_automorphisms("CyclicGroup(8)")
         assert "Aut(G) order:  4" in result  # Aut(Z_8) has order 4
+
+    async def test_gap_batch(self, gap_available):
+        result = await gap_batch(["Order(SymmetricGroup(4));", "IsSimple(AlternatingGroup(5));"])
+        assert result == ["24", "true"]